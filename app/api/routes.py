@@ -1,19 +1,26 @@
 from fastapi import APIRouter
 from pydantic import BaseModel
 from app.models.schemas import MVPCriteria
-from app.services.orchestrator import start_campaign
+from app.services.model_router import get_router, collect_snapshots
 from fastapi.responses import HTMLResponse
 
 router = APIRouter()
 
 class CampaignIn(BaseModel):
     criteria: MVPCriteria
+    capture_artifacts: bool = False  # QA screenshots, HTML snapshots and traces
 
 @router.post("/campaigns")
 def create_campaign(payload: CampaignIn):
-    run_id = start_campaign(payload.criteria)
+    from app.services.orchestrator import start_campaign  # lazy: pulls in LLM/Playwright stack
+    run_id = start_campaign(payload.criteria, capture_artifacts=payload.capture_artifacts)
     return {"status": "started", "run_id": run_id}
 
+@router.get("/llm/routing")
+def llm_routing():
+    # "local" is this replica; "processes" are snapshots every API/worker process publishes to Redis
+    return {"local": get_router().snapshot(), "processes": collect_snapshots()}
+
 @router.get("/mock_preview", response_class=HTMLResponse)
 def mock_preview():
     return """
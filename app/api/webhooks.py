@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Request
-from app.services.orchestrator import on_build_complete
+from fastapi import APIRouter, Request, HTTPException
+from starlette.concurrency import run_in_threadpool
+from loguru import logger
+from app.services.build_events import ingest_build_complete
 
 router = APIRouter()
 
 @router.post("/builds/complete")
 async def builds_complete(req: Request):
     payload = await req.json()
-    on_build_complete(payload)
-    return {"ok": True}
+    # Only DB insert + enqueue here; QA and LLM work run on the worker.
+    try:
+        result = await run_in_threadpool(
+            ingest_build_complete, payload, req.headers.get("Idempotency-Key")
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception:
+        # Broker/DB errors can carry hostnames or DSNs: keep them in our logs only
+        logger.exception("[Webhook] could not enqueue build event")
+        raise HTTPException(status_code=503, detail="Could not enqueue build event; retry later")
+    return {"ok": True, **result}
@@ -1,13 +1,15 @@
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from app.api.routes import router as api_router
 from app.api.webhooks import router as webhook_router
-from app.models.db import init_db
+from app.models.db import init_db_background, db_ping, DB_READY
 
 app = FastAPI(title="Toolkit Orchestrator", version="0.1.0")
 
 @app.on_event("startup")
 async def startup():
-    init_db()
+    # Don't block startup on the DB; /readyz flips once the schema is in place.
+    init_db_background()
 
 app.include_router(api_router, prefix="/api")
 app.include_router(webhook_router, prefix="/webhooks")
@@ -15,3 +17,15 @@ app.include_router(webhook_router, prefix="/webhooks")
 @app.get("/")
 def root():
     return {"ok": True, "service": "toolkit"}
+
+@app.get("/healthz")
+def healthz():
+    """Liveness: the process is up and serving. Never touches dependencies."""
+    return {"ok": True}
+
+@app.get("/readyz")
+def readyz():
+    """Readiness: DB schema initialised and reachable."""
+    if not (DB_READY.is_set() and db_ping()):
+        return JSONResponse({"ok": False, "db": False}, status_code=503)
+    return {"ok": True, "db": True}
@@ -1,50 +1,165 @@
 from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
-import os, time
+import os, time, json, threading
 from sqlalchemy.exc import OperationalError
+from loguru import logger
 
 ENGINE = None
 SessionLocal = None
 
-ENGINE = None
-SessionLocal = None
+# Set once the schema is in place; /readyz reports on this.
+DB_READY = threading.Event()
 
-def init_db():
+def init_engine():
+    """Create the engine/sessionmaker. Cheap: no connection is opened here."""
     global ENGINE, SessionLocal
+    if ENGINE is not None:
+        return ENGINE
     url = os.getenv("DATABASE_URL")
     if not url:
         raise RuntimeError("DATABASE_URL not set")
 
-    # Create engine once
     ENGINE = create_engine(url, pool_pre_ping=True)
     SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=ENGINE)
+    return ENGINE
+
+# Arbitrary constant; serialises DDL across the API and every worker process.
+_SCHEMA_LOCK_KEY = 44_0001
+
+def _ensure_schema():
+    with ENGINE.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": _SCHEMA_LOCK_KEY})
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS runs (
+                id SERIAL PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'created',
+                iterations INT NOT NULL DEFAULT 0,
+                app_id TEXT,
+                preview_url TEXT
+            );
+        """))
+        conn.execute(text("""
+            ALTER TABLE runs
+                ADD COLUMN IF NOT EXISTS spec JSONB,
+                ADD COLUMN IF NOT EXISTS criteria JSONB,
+                ADD COLUMN IF NOT EXISTS capture_artifacts BOOLEAN NOT NULL DEFAULT FALSE;
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS webhook_events (
+                id SERIAL PRIMARY KEY,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                delivery_id TEXT,
+                kind TEXT NOT NULL,
+                payload JSONB NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                claimed_by TEXT,
+                claimed_at TIMESTAMPTZ,
+                attempts INT NOT NULL DEFAULT 0,
+                received_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                processed_at TIMESTAMPTZ
+            );
+        """))
 
-    # 🔁 Wait for DB to be ready (up to ~60s)
-    deadline = time.time() + 60
+def init_db(timeout: float = 60):
+    """Blocking: wait for the DB (up to `timeout` seconds) and create tables."""
+    init_engine()
+
+    # 🔁 Wait for DB to be ready
+    deadline = time.time() + timeout
     while True:
         try:
-            with ENGINE.begin() as conn:
-                conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS runs (
-                        id SERIAL PRIMARY KEY,
-                        status TEXT NOT NULL DEFAULT 'created',
-                        iterations INT NOT NULL DEFAULT 0,
-                        app_id TEXT,
-                        preview_url TEXT
-                    );
-                """))
+            _ensure_schema()
             break
         except OperationalError:
             if time.time() > deadline:
                 raise
             time.sleep(1.5)
-        
-def save_run(run):
+    DB_READY.set()
+
+def wait_for_schema(timeout: float = 60):
+    """For workers: connect and wait until the API has created the schema (no DDL here)."""
+    init_engine()
+    deadline = time.time() + timeout
+    while True:
+        try:
+            with ENGINE.connect() as conn:
+                if conn.execute(text("SELECT to_regclass('webhook_events')")).scalar():
+                    break
+        except OperationalError:
+            pass
+        if time.time() > deadline:
+            raise RuntimeError("DB schema not ready")
+        time.sleep(1.5)
+    DB_READY.set()
+
+def init_db_background():
+    """Non-blocking init for the API: engine now, schema/wait on a daemon thread."""
+    init_engine()
+
+    def _run():
+        # Never give up: a replica stuck not-ready with healthy liveness would never be restarted.
+        delay = 2.0
+        while not DB_READY.is_set():
+            try:
+                init_db()
+            except Exception as e:
+                logger.error(f"[DB] init failed: {e!s}; retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, 60.0)
+
+    threading.Thread(target=_run, name="db-init", daemon=True).start()
+
+def db_ping() -> bool:
+    if ENGINE is None:
+        return False
+    try:
+        with ENGINE.connect() as conn:
+            conn.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+
+def save_run(run) -> int:
+    params = {
+        "status": run.get("status", "created"),
+        "iterations": run.get("iterations", 0),
+        "app_id": run.get("app_id"),
+        "preview_url": run.get("preview_url"),
+        "spec": json.dumps(run.get("spec")),
+        "criteria": json.dumps(run.get("criteria")),
+        "capture_artifacts": bool(run.get("capture_artifacts", False)),
+    }
     with ENGINE.begin() as conn:
-        conn.execute(text("""
-            INSERT INTO runs (status, iterations, app_id, preview_url, spec, criteria)
-            VALUES (:status, :iterations, :app_id, :preview_url, :spec, :criteria)
-        """), run)
+        return conn.execute(text("""
+            INSERT INTO runs (status, iterations, app_id, preview_url, spec, criteria, capture_artifacts)
+            VALUES (:status, :iterations, :app_id, :preview_url,
+                    CAST(:spec AS JSONB), CAST(:criteria AS JSONB), :capture_artifacts)
+            RETURNING id
+        """), params).scalar_one()
+
+def get_run(run_id):
+    with ENGINE.begin() as conn:
+        row = conn.execute(text("SELECT * FROM runs WHERE id=:id"), {"id": run_id}).mappings().first()
+    return dict(row) if row else None
+
+_RUN_COLUMNS = {"status", "iterations", "app_id", "preview_url"}
+
+def update_run(run_id, **fields):
+    cols = {k: v for k, v in fields.items() if k in _RUN_COLUMNS}
+    if not cols:
+        return
+    sets = ", ".join(f"{k}=:{k}" for k in cols)
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"UPDATE runs SET {sets} WHERE id=:id"), {**cols, "id": run_id})
+
+def advance_run_iteration(run_id, iteration: int) -> bool:
+    """Move a run from `iteration` to `iteration + 1` exactly once; False if it already moved."""
+    with ENGINE.begin() as conn:
+        return conn.execute(text("""
+            UPDATE runs SET iterations=:n + 1, status='building'
+            WHERE id=:id AND iterations=:n
+            RETURNING id
+        """), {"id": run_id, "n": iteration}).scalar() is not None
 
 def update_run_status(app_id, status, iterations=None, preview_url=None):
     with ENGINE.begin() as conn:
@@ -53,4 +168,60 @@ def update_run_status(app_id, status, iterations=None, preview_url=None):
                             iterations=COALESCE(:iterations, iterations),
                             preview_url=COALESCE(:preview_url, preview_url)
             WHERE app_id=:app_id
-        """), {"status": status, "iterations": iterations, "preview_url": preview_url, "app_id": app_id})
\ No newline at end of file
+        """), {"status": status, "iterations": iterations, "preview_url": preview_url, "app_id": app_id})
+
+# ---------- Webhook events (idempotent ingestion) ----------
+def record_webhook_event(idempotency_key: str, kind: str, payload: dict, lease_s: int,
+                         delivery_id: str = None):
+    """
+    Store an event once. Returns its id, or None if the key was already seen.
+    A redelivery revives the event if it failed or its processing lease expired.
+    """
+    with ENGINE.begin() as conn:
+        return conn.execute(text("""
+            INSERT INTO webhook_events (idempotency_key, delivery_id, kind, payload)
+            VALUES (:key, :delivery_id, :kind, CAST(:payload AS JSONB))
+            ON CONFLICT (idempotency_key) DO UPDATE
+                SET status='queued', claimed_by=NULL, claimed_at=NULL,
+                    delivery_id=EXCLUDED.delivery_id
+                WHERE webhook_events.status='failed'
+                   OR (webhook_events.status='processing'
+                       AND webhook_events.claimed_at < now() - make_interval(secs => :lease_s))
+            RETURNING id
+        """), {"key": idempotency_key, "delivery_id": delivery_id, "kind": kind,
+               "payload": json.dumps(payload), "lease_s": lease_s}).scalar()
+
+def delete_webhook_event(event_id: int):
+    with ENGINE.begin() as conn:
+        conn.execute(text("DELETE FROM webhook_events WHERE id=:id"), {"id": event_id})
+
+def claim_webhook_event(event_id: int, task_id: str, lease_s: int):
+    """
+    Move an event to 'processing' and return its payload; None if it's done or
+    another task holds a live lease. A redelivered task (same id) re-claims its own event.
+    """
+    with ENGINE.begin() as conn:
+        return conn.execute(text("""
+            UPDATE webhook_events
+            SET status='processing', claimed_by=:task_id, claimed_at=now(), attempts=attempts+1
+            WHERE id=:id AND (
+                status='queued'
+                OR (status='processing' AND (
+                    claimed_by=:task_id
+                    OR claimed_at < now() - make_interval(secs => :lease_s)))
+            )
+            RETURNING payload
+        """), {"id": event_id, "task_id": task_id, "lease_s": lease_s}).scalar()
+
+def release_webhook_event(event_id: int):
+    """Put a claimed event back to 'queued' (before a retry)."""
+    with ENGINE.begin() as conn:
+        conn.execute(text("""
+            UPDATE webhook_events SET status='queued', claimed_by=NULL, claimed_at=NULL WHERE id=:id
+        """), {"id": event_id})
+
+def finish_webhook_event(event_id: int, status: str):
+    with ENGINE.begin() as conn:
+        conn.execute(text("""
+            UPDATE webhook_events SET status=:status, processed_at=now() WHERE id=:id
+        """), {"id": event_id, "status": status})
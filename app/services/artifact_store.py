@@ -0,0 +1,312 @@
+# app/services/artifact_store.py
+from __future__ import annotations
+import os, time, shutil, atexit, threading, uuid
+from collections import deque
+from pathlib import Path
+from typing import Iterable, Optional, Tuple
+
+from loguru import logger
+
+# Config via env
+ARTIFACT_BACKEND = os.getenv("ARTIFACT_BACKEND", "local").lower()  # 'local' or 's3'
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", str(Path.cwd() / "artifacts"))
+ARTIFACT_S3_BUCKET = os.getenv("ARTIFACT_S3_BUCKET", "toolkit-artifacts")
+ARTIFACT_S3_ENDPOINT = os.getenv("ARTIFACT_S3_ENDPOINT") or None  # e.g. MinIO: http://minio:9000
+ARTIFACT_S3_PREFIX = os.getenv("ARTIFACT_S3_PREFIX", "").strip("/")
+
+# Retention: whichever limit is hit first wins (0 disables that limit)
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(2 * 1024 ** 3)))
+ARTIFACT_MAX_AGE_S = int(float(os.getenv("ARTIFACT_MAX_AGE_HOURS", "168")) * 3600)
+ARTIFACT_RETENTION_EVERY_S = int(os.getenv("ARTIFACT_RETENTION_EVERY_S", "60"))
+ARTIFACT_QUEUE_MAX_BYTES = int(float(os.getenv("ARTIFACT_QUEUE_MAX_MB", "64")) * 1024 ** 2)  # in-memory backlog
+ARTIFACT_FLUSH_TIMEOUT_S = float(os.getenv("ARTIFACT_FLUSH_TIMEOUT_S", "10"))  # at process exit
+STALE_PART_S = 3600  # a *.part file this old belongs to a crashed writer
+
+
+# ---------- Backends ----------
+class LocalBackend:
+    """Plain files under a root directory; keys map 1:1 to relative paths."""
+
+    def __init__(self, root: str = ARTIFACT_DIR):
+        self.root = Path(root)
+
+    def write(self, key: str, data: bytes) -> str:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".part")
+        try:
+            tmp.write_bytes(data)
+            tmp.replace(path)  # readers never see half-written files
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+        return str(path)
+
+    def write_file(self, key: str, src: str) -> str:
+        path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + ".part")
+        try:
+            shutil.move(src, tmp)  # rename when on the same filesystem
+            tmp.replace(path)
+        except Exception:
+            tmp.unlink(missing_ok=True)
+            raise
+        return str(path)
+
+    def location(self, key: str) -> str:
+        return str(self.root / key)
+
+    def list(self) -> Iterable[Tuple[str, int, float]]:
+        """Yield (key, size_bytes, mtime) for every stored artifact."""
+        if not self.root.exists():
+            return
+        now = time.time()
+        for p in self.root.rglob("*"):
+            if not p.is_file():
+                continue
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            # in-flight writes are skipped; leftovers from crashed writers count toward retention
+            if p.name.endswith(".part") and now - st.st_mtime < STALE_PART_S:
+                continue
+            yield p.relative_to(self.root).as_posix(), st.st_size, st.st_mtime
+
+    def delete(self, key: str) -> None:
+        path = self.root / key
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return
+        # prune empty run/iteration dirs
+        for parent in path.parents:
+            if parent == self.root:
+                break
+            try:
+                parent.rmdir()
+            except OSError:
+                break
+
+
+class S3Backend:
+    """
+    Any S3-compatible store (AWS, MinIO, R2…). boto3 is optional and only
+    imported when this backend is selected; LocalBackend is a drop-in stand-in.
+    """
+
+    def __init__(self, bucket: str = ARTIFACT_S3_BUCKET, endpoint_url: Optional[str] = ARTIFACT_S3_ENDPOINT,
+                 prefix: str = ARTIFACT_S3_PREFIX, client=None):
+        if client is None:
+            try:
+                import boto3
+            except ImportError as e:
+                raise RuntimeError("ARTIFACT_BACKEND=s3 requires boto3 (pip install boto3)") from e
+            client = boto3.client("s3", endpoint_url=endpoint_url)
+        self._s3 = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def _full(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def write(self, key: str, data: bytes) -> str:
+        self._s3.put_object(Bucket=self.bucket, Key=self._full(key), Body=data)
+        return self.location(key)
+
+    def write_file(self, key: str, src: str) -> str:
+        self._s3.upload_file(src, self.bucket, self._full(key))
+        return self.location(key)
+
+    def location(self, key: str) -> str:
+        return f"s3://{self.bucket}/{self._full(key)}"
+
+    def list(self) -> Iterable[Tuple[str, int, float]]:
+        kwargs = {"Bucket": self.bucket}
+        if self.prefix:
+            kwargs["Prefix"] = self.prefix + "/"
+        for page in self._s3.get_paginator("list_objects_v2").paginate(**kwargs):
+            for obj in page.get("Contents", []):
+                key = obj["Key"]
+                if self.prefix:
+                    key = key[len(self.prefix) + 1:]
+                yield key, obj["Size"], obj["LastModified"].timestamp()
+
+    def delete(self, key: str) -> None:
+        self._s3.delete_object(Bucket=self.bucket, Key=self._full(key))
+
+
+def make_backend(kind: str = ARTIFACT_BACKEND):
+    if kind == "s3":
+        return S3Backend()
+    if kind != "local":
+        logger.warning(f"[Artifacts] unknown ARTIFACT_BACKEND={kind!r}; using local")
+    return LocalBackend()
+
+
+# ---------- Store ----------
+class ArtifactStore:
+    """
+    Writes artifacts on a single background thread so callers (bot, QA) never
+    block on disk or network. Retention runs on the same thread.
+    """
+
+    def __init__(self, backend=None, max_bytes: int = ARTIFACT_MAX_BYTES, max_age_s: int = ARTIFACT_MAX_AGE_S,
+                 max_queue_bytes: int = ARTIFACT_QUEUE_MAX_BYTES):
+        self.backend = backend or make_backend()
+        self.max_bytes = max_bytes
+        self.max_age_s = max_age_s
+        self.max_queue_bytes = max_queue_bytes
+        self._items: deque = deque()  # (key, data|None, src_path|None)
+        self._cond = threading.Condition()
+        self._pending = 0        # queued + in-flight items
+        self._pending_bytes = 0  # in-memory payload bytes among them
+        self._thread: Optional[threading.Thread] = None
+        self._last_retention = 0.0
+
+    def _ensure_started(self):
+        # caller holds self._cond
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="artifact-writer", daemon=True)
+        self._thread.start()
+
+    def location(self, key: str) -> str:
+        return self.backend.location(key)
+
+    def put(self, key: str, data: bytes) -> Optional[str]:
+        """Queue `data` for writing under `key`; returns its final location, or None if dropped."""
+        with self._cond:
+            if self._pending_bytes + len(data) > self.max_queue_bytes:
+                # Artifacts are diagnostics: never stall the caller (or balloon memory) for them
+                logger.warning(f"[Artifacts] write backlog over {self.max_queue_bytes} bytes; dropping {key}")
+                return None
+            self._enqueue(key, data, None)
+        return self.location(key)
+
+    def put_file(self, key: str, src) -> str:
+        """Queue a file already on disk; the writer thread moves/uploads it and removes `src`."""
+        with self._cond:
+            self._enqueue(key, None, str(src))
+        return self.location(key)
+
+    def _enqueue(self, key, data, src):
+        self._ensure_started()
+        self._items.append((key, data, src))
+        self._pending += 1
+        self._pending_bytes += len(data) if data is not None else 0
+        self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything queued so far is written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._items)
+                key, data, src = self._items.popleft()
+            try:
+                if src is not None:
+                    self.backend.write_file(key, src)
+                else:
+                    self.backend.write(key, data)
+            except Exception as e:
+                logger.warning(f"[Artifacts] write failed for {key}: {e!s}")
+            finally:
+                if src is not None:
+                    Path(src).unlink(missing_ok=True)
+                with self._cond:
+                    self._pending -= 1
+                    self._pending_bytes -= len(data) if data is not None else 0
+                    self._cond.notify_all()
+            if time.time() - self._last_retention >= ARTIFACT_RETENTION_EVERY_S:
+                self.enforce_retention()
+
+    def enforce_retention(self) -> int:
+        """Delete artifacts older than max_age_s, then oldest-first until under max_bytes."""
+        self._last_retention = time.time()
+        try:
+            items = sorted(self.backend.list(), key=lambda x: x[2])  # oldest first
+        except Exception as e:
+            logger.warning(f"[Artifacts] retention list failed: {e!s}")
+            return 0
+
+        now = time.time()
+        total = sum(size for _, size, _ in items)
+        removed = 0
+        for key, size, mtime in items:
+            too_old = self.max_age_s and now - mtime > self.max_age_s
+            too_big = self.max_bytes and total > self.max_bytes
+            if not (too_old or too_big):
+                break
+            try:
+                self.backend.delete(key)
+            except Exception as e:
+                logger.warning(f"[Artifacts] delete failed for {key}: {e!s}")
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"[Artifacts] retention removed {removed} artifact(s)")
+        return removed
+
+    def recorder(self, run_id=None, iteration: int = 0, capture: bool = False) -> "ArtifactRecorder":
+        return ArtifactRecorder(self, run_id, iteration, capture)
+
+
+class ArtifactRecorder:
+    """
+    Per-run/iteration view of the store. Failure screenshots are always kept;
+    traces, HTML snapshots and QA screenshots only when `capture` is on.
+    """
+
+    def __init__(self, store: ArtifactStore, run_id=None, iteration: int = 0, capture: bool = False):
+        self.store = store
+        # Unscoped callers still get a unique prefix so concurrent runs can't collide
+        self.run_id = str(run_id) if run_id is not None else f"adhoc-{uuid.uuid4().hex[:8]}"
+        self.iteration = iteration
+        self.capture = capture
+
+    def key(self, name: str) -> str:
+        return f"{self.run_id}/iter-{self.iteration:03d}/{name}"
+
+    def save(self, name: str, data) -> Optional[str]:
+        """Returns where the artifact will land (local path or s3:// URI), or None if dropped."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        return self.store.put(self.key(name), data)
+
+    def save_file(self, name: str, path) -> str:
+        """Takes ownership of `path`: the writer thread moves/uploads it, then deletes it."""
+        return self.store.put_file(self.key(name), path)
+
+    def screenshot(self, page, name: str) -> Optional[str]:
+        """Grab a full-page screenshot in memory and hand it to the writer thread."""
+        try:
+            return self.save(name, page.screenshot(full_page=True))
+        except Exception:
+            return None
+
+
+_store: Optional[ArtifactStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> ArtifactStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+                # Writer is a daemon thread: don't lose failure screenshots at exit
+                atexit.register(_store.flush, ARTIFACT_FLUSH_TIMEOUT_S)
+    return _store
+
+def flush_default(timeout: float = ARTIFACT_FLUSH_TIMEOUT_S) -> bool:
+    """Flush the process-wide store if it was ever used (for worker shutdown hooks)."""
+    return _store.flush(timeout) if _store is not None else True
+
+def recorder(run_id=None, iteration: int = 0, capture: bool = False) -> ArtifactRecorder:
+    return get_store().recorder(run_id, iteration, capture)
@@ -6,6 +6,8 @@ from typing import Optional, Tuple
 from loguru import logger
 from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
 
+from app.services.artifact_store import ArtifactRecorder, recorder as artifact_recorder
+
 # Config via env (with sensible defaults/overrides)
 BASE44_URL = os.getenv("BASE44_URL", "https://app.base44.com").rstrip("/")
 BASE44_EMAIL = os.getenv("BASE44_EMAIL", "")
@@ -46,15 +48,14 @@ STORAGE_STATE = os.path.join(USER_DATA_DIR, "storage_state.json")
 
 DASH_URL_SNIPPETS = ["/dashboard", "/home", "/projects", "/apps"]
 
-ARTIFACT_DIR = Path.cwd() / "artifacts"
-ARTIFACT_DIR.mkdir(exist_ok=True)
-
 _lock = threading.Lock()  # simple cross-thread guard
 
 class Base44Bot:
-    def __init__(self, headless: bool = False):
+    def __init__(self, headless: bool = False, artifacts: Optional[ArtifactRecorder] = None):
         # runtime evaluation so env set before import isn't required
         self.headless = headless
+        # failure screenshots go to the run-scoped store (written in the background)
+        self.artifacts = artifacts or artifact_recorder()
         # slow_mo is also read at runtime
         self._slow_mo_ms = int(os.getenv("BASE44_SLOW_MO_MS", "0"))
         self._p = None
@@ -134,11 +135,9 @@ class Base44Bot:
             except Exception: pass
             return
         except Exception:
-            ss = ARTIFACT_DIR / "login_missing_builder.png"
-            try: page.screenshot(path=str(ss), full_page=True)
-            except Exception: pass
+            ss = self.artifacts.screenshot(page, "login_missing_builder.png")
             raise RuntimeError(
-                f"Builder not visible (likely not logged in). Screenshot: {ss}. "
+                f"Builder not visible (likely not logged in). Screenshot: {ss or 'unavailable'}. "
                 "Log in once and re-seed storage_state.json or run with a persistent profile."
             )
 
@@ -241,10 +240,8 @@ class Base44Bot:
                 pass
 
         if not submitted:
-            ss = ARTIFACT_DIR / "submit_failed.png"
-            try: self._page.screenshot(path=str(ss), full_page=True)
-            except Exception: pass
-            raise RuntimeError(f"Could not submit spec. Screenshot: {ss}")
+            ss = self.artifacts.screenshot(self._page, "submit_failed.png")
+            raise RuntimeError(f"Could not submit spec. Screenshot: {ss or 'unavailable'}")
 
         # Wait for preview to appear or a new tab to open with /preview/
         preview_url = self._wait_for_preview_url()
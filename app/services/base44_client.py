@@ -1,25 +1,27 @@
 import os
 from loguru import logger
-from app.services.base44_bot import Base44Bot
 
 BASE44_MODE = os.getenv("BASE44_MODE", "ui").lower()  # 'ui' or 'stub'
 
-def base44_create(prompt_text: str):
+def base44_create(prompt_text: str, artifacts=None):
     """
     Build via the UI (Playwright) and return (app_id, preview_url).
     Falls back to stub if BASE44_MODE != 'ui'.
+    `artifacts` is an optional ArtifactRecorder for failure screenshots.
     """
     if BASE44_MODE != "ui":
         logger.warning("[Base44] BASE44_MODE != ui; using stub create()")
         return base44_create_stub({"name": "unknown"})
 
-    with Base44Bot() as bot:
+    from app.services.base44_bot import Base44Bot  # lazy: Playwright is heavy
+
+    with Base44Bot(artifacts=artifacts) as bot:
         logger.info("[Base44] Starting UI build…")
         app_id, preview_url = bot.build_from_spec(prompt_text)
         logger.info(f"[Base44] UI build ok: app_id={app_id} preview={preview_url}")
         return app_id, preview_url
 
-def base44_update(app_id: str, change_request: dict):
+def base44_update(app_id: str, change_request: dict, artifacts=None):
     """
     (Optional) Implement update via UI:
     - Navigate to app page
@@ -31,7 +33,7 @@ def base44_update(app_id: str, change_request: dict):
         return base44_update_stub(app_id, change_request)
 
     # Example placeholder: you will mirror build_from_spec but on the app page.
-    # with Base44Bot() as bot:
+    # with Base44Bot(artifacts=artifacts) as bot:
     #     bot.ensure_logged_in()
     #     bot.page.goto(f"{BASE44_URL}/apps/{app_id}")
     #     # paste CR, click Update, wait for preview readiness
@@ -0,0 +1,42 @@
+# app/services/build_events.py
+import os
+from typing import Optional
+from loguru import logger
+from app.models.db import record_webhook_event, delete_webhook_event
+
+KIND_BUILD_COMPLETE = "builds.complete"
+
+# How long a worker may hold an event before it's considered dead and the event can be reclaimed.
+# Must exceed the longest QA + critic + update cycle.
+WEBHOOK_LEASE_S = int(os.getenv("WEBHOOK_LEASE_S", "1800"))
+
+def build_complete_key(payload: dict) -> str:
+    """One QA cycle per (run, iteration); both must come from the event itself."""
+    run_id = payload.get("run_id")
+    iteration = payload.get("iteration")
+    if run_id is None or iteration is None:
+        raise ValueError("build complete event needs run_id and iteration")
+    return f"{KIND_BUILD_COMPLETE}:{run_id}:{iteration}"
+
+def ingest_build_complete(payload: dict, delivery_id: Optional[str] = None) -> dict:
+    """
+    Store the event and hand it to the worker. Never runs QA/LLM work itself.
+    Dedupes on (run, iteration); `delivery_id` (Idempotency-Key header) is only recorded.
+    Returns {"queued": bool, "duplicate": bool, "event_id": int|None}.
+    """
+    key = build_complete_key(payload)
+
+    event_id = record_webhook_event(key, KIND_BUILD_COMPLETE, payload, WEBHOOK_LEASE_S, delivery_id)
+    if event_id is None:
+        logger.info(f"[Webhook] duplicate delivery dropped: {key}")
+        return {"queued": False, "duplicate": True, "event_id": None}
+
+    from worker.tasks import process_build_complete  # lazy: keeps celery out of import graph
+    try:
+        process_build_complete.delay(event_id)
+    except Exception:
+        # Let the sender's retry go through instead of being dropped as a duplicate
+        delete_webhook_event(event_id)
+        raise
+    logger.info(f"[Webhook] queued {key} as event {event_id}")
+    return {"queued": True, "duplicate": False, "event_id": event_id}
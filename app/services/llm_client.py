@@ -1,10 +1,11 @@
-import os, json, httpx
+import os, json
+from app.services.model_router import get_router
 
 OPENAI_API_KEY = os.getenv("LLM_API_KEY")
-MODEL = os.getenv("LLM_MODEL")  # choose yours
 
 class LLMAuthError(RuntimeError): pass
 class LLMHTTPError(RuntimeError): pass
+class LLMRetryableError(LLMHTTPError): pass  # network/timeout/429/5xx: worth another model
 class LLMFormatError(RuntimeError): pass
 
 
@@ -23,12 +24,31 @@ def _strip_fences(s: str) -> str:
 def _openai_chat_json(
     system: str,
     user: str,
-    fallback_model: str = "gpt-4.1-mini",
+    stage: str,
     *,
     enforce_json_object: bool = False
 ) -> str:
+    """Route to the best model for `stage` (see model_router); fail over on transient errors only."""
+    return get_router().call(
+        stage,
+        lambda model, max_tokens, timeout: _openai_chat(
+            system, user, model, max_tokens, timeout, enforce_json_object=enforce_json_object
+        ),
+        retryable=(LLMRetryableError,),
+    )
+
+def _openai_chat(
+    system: str,
+    user: str,
+    model: str,
+    max_tokens: int,
+    timeout: float,
+    *,
+    enforce_json_object: bool = False
+) -> str:
+    import httpx  # lazy: keeps API/worker import time down
+
     key = OPENAI_API_KEY
-    model = (os.getenv("LLM_MODEL") or fallback_model).strip() or MODEL
 
     headers = {
         "Authorization": f"Bearer {key}",
@@ -41,6 +61,7 @@ def _openai_chat_json(
             {"role": "user", "content": user},
         ],
         "temperature": 0,
+        "max_tokens": max_tokens,
     }
     if enforce_json_object:
         payload["response_format"] = {"type": "json_object"}  # requires 4.1/4o family
@@ -51,10 +72,10 @@ def _openai_chat_json(
             "https://api.openai.com/v1/chat/completions",
             headers=headers,
             json=payload,
-            timeout=60,
+            timeout=timeout,
         )
     except httpx.RequestError as e:
-        raise LLMHTTPError(f"Network error calling OpenAI: {e!s}")
+        raise LLMRetryableError(f"Network error calling OpenAI: {e!s}")
 
     # Helpful errors
     if r.status_code == 401:
@@ -66,7 +87,7 @@ def _openai_chat_json(
             detail = r.json().get("error", {}).get("message", r.text)
         except Exception:
             detail = r.text
-        raise LLMHTTPError(f"Rate limit (429): {detail}")
+        raise LLMRetryableError(f"Rate limit (429): {detail}")
     if r.status_code == 400:
         try:
             detail = r.json().get("error", {}).get("message", r.text)
@@ -78,14 +99,19 @@ def _openai_chat_json(
             detail = r.json().get("error", {}).get("message", r.text)
         except Exception:
             detail = r.text
-        raise LLMHTTPError(f"OpenAI error {r.status_code}: {detail}")
+        err = LLMRetryableError if r.status_code >= 500 else LLMHTTPError
+        raise err(f"OpenAI error {r.status_code}: {detail}")
 
     try:
         data = r.json()
-        content = data["choices"][0]["message"]["content"]
+        choice = data["choices"][0]
+        content = choice["message"]["content"]
     except (ValueError, KeyError, IndexError, TypeError) as e:
         raise LLMFormatError(f"Unexpected OpenAI response shape: {e}. Body={r.text}")
 
+    if choice.get("finish_reason") == "length":
+        raise LLMFormatError(f"Output truncated at max_tokens={max_tokens} (model={model})")
+
     if not isinstance(content, str) or not content.strip():
         raise LLMFormatError("Empty content from model")
 
@@ -98,7 +124,7 @@ def ideate(criteria):
         'Each item must be {"idea": string, "score": number}.'
     )
     user = f"Propose 5 app ideas matching this criteria: {criteria.model_dump_json()}"
-    raw = _openai_chat_json(system, user, enforce_json_object=False)  # ARRAY → no enforcement
+    raw = _openai_chat_json(system, user, "ideate", enforce_json_object=False)  # ARRAY → no enforcement
     print("idea generation raw:", raw)  # Debug print
     try:
         data = json.loads(_strip_fences(raw))
@@ -116,7 +142,7 @@ def ideate(criteria):
 def spec_writer(criteria, idea):
     system = "You output ONLY valid JSON for an App spec object with acceptance_tests using data-test selectors."
     user = f"Turn this idea and criteria into a minimal spec: criteria={criteria.model_dump_json()} idea={json.dumps(idea)}"
-    raw = _openai_chat_json(system, user, "gpt-4o-mini", enforce_json_object=True)  # OBJECT → enforce
+    raw = _openai_chat_json(system, user, "spec", enforce_json_object=True)  # OBJECT → enforce
 
     print("spec writer raw:", raw)  # Debug print
     return json.loads(_strip_fences(raw))
@@ -124,6 +150,6 @@ def spec_writer(criteria, idea):
 def critic(spec, qa_report):
     system = "You output ONLY valid JSON for a minimal ChangeRequest to pass next QA iteration."
     user = f"Spec={json.dumps(spec)} QA={json.dumps(qa_report)}"
-    raw = _openai_chat_json(system, user, "gpt-4o-mini", enforce_json_object=True)  # OBJECT → enforce
+    raw = _openai_chat_json(system, user, "critic", enforce_json_object=True)  # OBJECT → enforce
     return json.loads(_strip_fences(raw))
 
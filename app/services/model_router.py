@@ -0,0 +1,259 @@
+# app/services/model_router.py
+from __future__ import annotations
+import os, json, time, random, socket, threading
+from collections import deque, Counter
+from typing import Callable, Dict, List, Optional
+
+from loguru import logger
+
+# Per-stage candidates (LLM_MODEL, if set, is prepended), output cap, per-attempt timeout
+# and total budget across failovers. Override with e.g. LLM_ROUTE_CRITIC="gpt-4o-mini,gpt-4.1-mini",
+# LLM_MAX_TOKENS_SPEC=3000, LLM_TIMEOUT_SPEC=40, LLM_BUDGET_SPEC=60
+STAGE_DEFAULTS = {
+    "ideate": {"models": ["gpt-4.1-mini", "gpt-4o-mini"], "max_tokens": 1000, "timeout_s": 30, "budget_s": 45},
+    "spec":   {"models": ["gpt-4o-mini", "gpt-4.1-mini"], "max_tokens": 3000, "timeout_s": 40, "budget_s": 60},
+    "critic": {"models": ["gpt-4o-mini", "gpt-4.1-mini"], "max_tokens": 1000, "timeout_s": 30, "budget_s": 45},
+}
+
+WINDOW = int(os.getenv("LLM_ROUTER_WINDOW", "50"))            # samples kept per model
+WINDOW_S = float(os.getenv("LLM_ROUTER_WINDOW_S", "600"))     # ...and only this recent
+MIN_SAMPLES = int(os.getenv("LLM_ROUTER_MIN_SAMPLES", "5"))   # before p95/error rate count
+MAX_ERROR_RATE = float(os.getenv("LLM_ROUTER_MAX_ERROR_RATE", "0.5"))
+COOLDOWN_S = float(os.getenv("LLM_ROUTER_COOLDOWN_S", "60"))  # benched after going unhealthy
+PROBE_RATE = float(os.getenv("LLM_ROUTER_PROBE_RATE", "0.05"))  # share of calls sent to an unmeasured model
+MIN_ATTEMPT_S = 2.0  # don't start a failover attempt with less budget than this
+
+# Snapshots are published to Redis so /api/llm/routing can show every process (e.g. critic on the worker)
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
+PUBLISH_KEY_PREFIX = "toolkit:llm_routing:"
+PUBLISH_TTL_S = 600
+PUBLISH_EVERY_S = float(os.getenv("LLM_ROUTER_PUBLISH_EVERY_S", "10"))
+
+
+class ModelStats:
+    """Rolling latency/error window for one model."""
+
+    def __init__(self):
+        self._samples: deque = deque(maxlen=WINDOW)  # (ts, latency_s, ok)
+        self._lock = threading.Lock()
+        self.benched_until = 0.0
+
+    def record(self, latency_s: float, ok: bool):
+        with self._lock:
+            self._samples.append((time.time(), latency_s, ok))
+
+    def _recent(self):
+        cutoff = time.time() - WINDOW_S
+        with self._lock:
+            return [s for s in self._samples if s[0] >= cutoff]
+
+    def p95(self) -> Optional[float]:
+        # Failures count at their elapsed time, so a model that times out looks slow, not fast
+        lat = sorted(l for _, l, _ in self._recent())
+        if len(lat) < MIN_SAMPLES:
+            return None
+        return lat[min(len(lat) - 1, int(0.95 * len(lat)))]
+
+    def error_rate(self) -> Optional[float]:
+        recent = self._recent()
+        if len(recent) < MIN_SAMPLES:
+            return None
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+    def healthy(self) -> bool:
+        """Read-only health check."""
+        if time.time() < self.benched_until:
+            return False
+        rate = self.error_rate()
+        return rate is None or rate <= MAX_ERROR_RATE
+
+    def update_health(self) -> bool:
+        """Bench the model for COOLDOWN_S if its error rate is too high; returns healthy()."""
+        if self.healthy():
+            return True
+        if time.time() >= self.benched_until:
+            self.benched_until = time.time() + COOLDOWN_S
+            with self._lock:
+                self._samples.clear()  # re-measured (via probes) after the cooldown
+        return False
+
+
+class ModelRouter:
+    """
+    Picks a model per stage: fastest healthy candidate by rolling p95, failing
+    over down the ranked list on retryable errors within the stage's time budget.
+    Unmeasured models rank after measured ones and get PROBE_RATE of first picks.
+    """
+
+    def __init__(self, stages: Optional[Dict[str, dict]] = None,
+                 publish_every_s: Optional[float] = PUBLISH_EVERY_S):
+        self.stages = stages or _stages_from_env()
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+        self.decisions: Counter = Counter()  # (stage, model) -> times chosen first
+        self.failovers: Counter = Counter()  # (stage, from_model) -> times abandoned
+        self.publish_every_s = publish_every_s  # None: don't publish
+        self._dirty = threading.Event()
+        self._publisher: Optional[threading.Thread] = None
+
+    def stats(self, model: str) -> ModelStats:
+        with self._lock:
+            if model not in self._stats:
+                self._stats[model] = ModelStats()
+            return self._stats[model]
+
+    def rank(self, stage: str) -> List[str]:
+        models = self.stages[stage]["models"]
+        healthy = [m for m in models if self.stats(m).update_health()]
+        if not healthy:
+            healthy = list(models)  # everything benched: still try, in config order
+
+        measured = sorted(
+            (m for m in healthy if self.stats(m).p95() is not None),
+            key=lambda m: (self.stats(m).p95(), models.index(m)),
+        )
+        unmeasured = [m for m in healthy if m not in measured]
+        if measured and unmeasured and random.random() < PROBE_RATE:
+            return unmeasured[:1] + measured + unmeasured[1:]
+        return measured + unmeasured
+
+    def call(self, stage: str, fn: Callable[[str, int, float], str], retryable=(Exception,)) -> str:
+        """
+        Run fn(model, max_tokens, timeout_s) on the best model, failing over on
+        `retryable`. All attempts share the stage's budget_s.
+        """
+        cfg = self.stages[stage]
+        ranked = self.rank(stage)
+        self.decisions[(stage, ranked[0])] += 1
+        deadline = time.perf_counter() + cfg["budget_s"]
+        last_exc = None
+        try:
+            for i, model in enumerate(ranked):
+                remaining = deadline - time.perf_counter()
+                if i and remaining < MIN_ATTEMPT_S:
+                    logger.warning(f"[LLM] {stage}: budget exhausted before trying {model}")
+                    break
+                t0 = time.perf_counter()
+                try:
+                    out = fn(model, cfg["max_tokens"], min(cfg["timeout_s"], remaining))
+                except retryable as e:
+                    self.stats(model).record(time.perf_counter() - t0, ok=False)
+                    self.failovers[(stage, model)] += 1
+                    logger.warning(f"[LLM] {stage}: {model} failed ({e!s}); failing over")
+                    last_exc = e
+                    continue
+                latency = time.perf_counter() - t0
+                self.stats(model).record(latency, ok=True)
+                logger.info(f"[LLM] {stage}: model={model} latency={latency:.2f}s")
+                return out
+            raise last_exc
+        finally:
+            self._mark_dirty()  # non-blocking; the publisher thread does the Redis write
+
+    def snapshot(self) -> dict:
+        """Routing metrics: per-model p95/error rate/health and decision counters. Read-only."""
+        with self._lock:
+            models = dict(self._stats)
+        return {
+            "models": {
+                m: {
+                    "p95_s": s.p95(),
+                    "error_rate": s.error_rate(),
+                    "healthy": s.healthy(),
+                }
+                for m, s in models.items()
+            },
+            "decisions": {f"{st}:{m}": n for (st, m), n in self.decisions.items()},
+            "failovers": {f"{st}:{m}": n for (st, m), n in self.failovers.items()},
+            "stages": self.stages,
+        }
+
+    def _mark_dirty(self):
+        if self.publish_every_s is None:
+            return
+        self._dirty.set()
+        if self._publisher is None or not self._publisher.is_alive():
+            with self._lock:
+                if self._publisher is None or not self._publisher.is_alive():
+                    self._publisher = threading.Thread(target=self._publish_loop, name="llm-routing-publisher", daemon=True)
+                    self._publisher.start()
+
+    def _publish_loop(self):
+        # Off the request path: a slow or unreachable Redis never delays an LLM call
+        while True:
+            self._dirty.wait()
+            self._dirty.clear()
+            self.publish()
+            time.sleep(self.publish_every_s)
+
+    def publish(self):
+        """Best-effort: share this process's snapshot via Redis (see collect_snapshots)."""
+        client = _redis()
+        if client is None:
+            return
+        try:
+            client.set(PUBLISH_KEY_PREFIX + _process_id(), json.dumps(self.snapshot()), ex=PUBLISH_TTL_S)
+        except Exception as e:
+            logger.debug(f"[LLM] routing snapshot publish failed: {e!s}")
+
+
+def _stages_from_env() -> Dict[str, dict]:
+    primary = (os.getenv("LLM_MODEL") or "").strip()
+    stages = {}
+    for stage, d in STAGE_DEFAULTS.items():
+        env_models = os.getenv(f"LLM_ROUTE_{stage.upper()}", "")
+        models = [m.strip() for m in env_models.split(",") if m.strip()]
+        if not models:
+            models = ([primary] if primary else []) + d["models"]
+        stages[stage] = {
+            "models": list(dict.fromkeys(models)),  # dedupe, keep order
+            "max_tokens": int(os.getenv(f"LLM_MAX_TOKENS_{stage.upper()}", d["max_tokens"])),
+            "timeout_s": float(os.getenv(f"LLM_TIMEOUT_{stage.upper()}", d["timeout_s"])),
+            "budget_s": float(os.getenv(f"LLM_BUDGET_{stage.upper()}", d["budget_s"])),
+        }
+    return stages
+
+
+def _process_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+_redis_client = None
+
+def _redis():
+    global _redis_client
+    if _redis_client is None:
+        try:
+            import redis  # lazy: installed with celery[redis]
+            _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+        except Exception as e:
+            logger.debug(f"[LLM] redis unavailable for routing metrics: {e!s}")
+            _redis_client = False
+    return _redis_client or None
+
+def collect_snapshots() -> Dict[str, dict]:
+    """Latest published snapshot per process (API replicas and workers)."""
+    client = _redis()
+    if client is None:
+        return {}
+    out = {}
+    try:
+        for key in client.scan_iter(PUBLISH_KEY_PREFIX + "*"):
+            raw = client.get(key)
+            if raw:
+                name = key.decode() if isinstance(key, bytes) else key
+                out[name[len(PUBLISH_KEY_PREFIX):]] = json.loads(raw)
+    except Exception as e:
+        logger.debug(f"[LLM] routing snapshot collect failed: {e!s}")
+    return out
+
+
+_router: Optional[ModelRouter] = None
+_router_lock = threading.Lock()
+
+def get_router() -> ModelRouter:
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
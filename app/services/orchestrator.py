@@ -1,54 +1,80 @@
 # app/services/orchestrator.py
 from loguru import logger
+from app.models.db import save_run, get_run, update_run, advance_run_iteration
 from app.services.llm_client import ideate, spec_writer, critic
 from app.services.base44_client import base44_create, base44_update
 from app.services.qa_runner import run as qa_run
+from app.services.artifact_store import recorder as artifact_recorder
+from app.services.build_events import ingest_build_complete
 
-_state = {}  # keep in-memory for now
+# Run state lives in the `runs` table so the API and worker processes share it.
 
-def start_campaign(criteria):
+def start_campaign(criteria, capture_artifacts: bool = False):
     ideas = ideate(criteria)
     top = ideas[0]
     spec = spec_writer(criteria, top)
 
-    app_id, preview_url = base44_create(spec)
-
-    run_id = len(_state) + 1
-    _state[run_id] = {
-        "status": "building",
+    run_id = save_run({
+        "status": "created",
         "iterations": 0,
-        "app_id": app_id,
-        "preview_url": preview_url,
         "spec": spec,
         "criteria": criteria.model_dump(),
-    }
+        "capture_artifacts": capture_artifacts,
+    })
+    artifacts = artifact_recorder(run_id, 0, capture_artifacts)
+    app_id, preview_url = base44_create(spec, artifacts=artifacts)
+
+    update_run(run_id, status="building", app_id=app_id, preview_url=preview_url)
     logger.info(f"Run {run_id} started; app_id={app_id}")
 
     # NOTE: when Base44 webhook is real, delete the next line and rely on /webhooks/builds/complete
-    on_build_complete({"run_id": run_id, "app_id": app_id, "preview_url": preview_url})
+    ingest_build_complete({"run_id": run_id, "iteration": 0, "app_id": app_id, "preview_url": preview_url})
     return run_id
 
 def on_build_complete(payload: dict):
+    """Runs on the worker (see worker.tasks.process_build_complete). Safe to replay."""
     run_id = payload.get("run_id")
-    run = _state.get(run_id)
+    iteration = payload.get("iteration")
+    run = get_run(run_id)
     if not run:
         return
 
-    run["status"] = "built"
+    if iteration != run["iterations"]:
+        if iteration is not None and run["iterations"] == iteration + 1 and run["status"] == "building":
+            # A replay of this event after the run already advanced: only make sure the
+            # next completion was handed off (deduped if it already was).
+            _simulate_next_build(run_id, run["iterations"], run)
+        else:
+            logger.info(f"Run {run_id}: dropping stale event for iter={iteration} (run at {run['iterations']})")
+        return
+
+    update_run(run_id, status="built")
+    artifacts = artifact_recorder(run_id, iteration, run["capture_artifacts"])
 
     # 🔎 Real QA: visit preview_url and assert data-test selectors from the spec's acceptance_tests
-    report = qa_run(run["spec"]["acceptance_tests"], run["preview_url"])
+    report = qa_run(run["spec"]["acceptance_tests"], run["preview_url"], artifacts=artifacts)
 
     if report.passed:
-        run["status"] = "passed"
+        update_run(run_id, status="passed")
         logger.info(f"Run {run_id} PASSED. Archiving.")
         return
 
+    max_iterations = (run["criteria"] or {}).get("max_iterations", 3)
+    if iteration >= max_iterations:
+        update_run(run_id, status="failed")
+        logger.info(f"Run {run_id} FAILED after {iteration} iterations.")
+        return
+
     # ❌ Failing → request smallest change; iterate (still using stub critic)
     cr = critic(run["spec"], {"results": [], "passed": False})
-    base44_update(run["app_id"], cr)
-    run["iterations"] += 1
-    logger.info(f"Run {run_id} iter={run['iterations']} updating app…")
+    base44_update(run["app_id"], cr, artifacts=artifacts)
+    if not advance_run_iteration(run_id, iteration):
+        logger.info(f"Run {run_id}: iter={iteration} already advanced by another delivery")
+        return
+    logger.info(f"Run {run_id} iter={iteration + 1} updating app…")
+
+    _simulate_next_build(run_id, iteration + 1, run)
 
+def _simulate_next_build(run_id, iteration: int, run: dict):
     # NOTE: when Base44 webhook is real, remove this self-call. Now we simulate the next completion.
-    on_build_complete({"run_id": run_id, "app_id": run["app_id"], "preview_url": run["preview_url"]})
+    ingest_build_complete({"run_id": run_id, "iteration": iteration, "app_id": run["app_id"], "preview_url": run["preview_url"]})
@@ -1,49 +1,81 @@
 # app/services/qa_runner.py
-from playwright.sync_api import sync_playwright
+import os, tempfile
 
-def run(tests, preview_url):
+def run(tests, preview_url, artifacts=None):
+    """
+    `artifacts` is an optional ArtifactRecorder. Screenshot, HTML snapshot and
+    Playwright trace are only captured when `artifacts.capture` is on.
+    """
+    from playwright.sync_api import sync_playwright  # lazy: only the worker needs a browser
+
+    capture = bool(artifacts and artifacts.capture)
     results = []
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        page.goto(preview_url, wait_until="networkidle")
-
-        for t in tests:
-            method = t.get("method")
-            selector = t.get("selector")
-            ok = False
-
-            if method == "dom":
-                if "assert" in t:
-                    html = page.inner_html(selector)
-                    ok = all(s in html for s in t["assert"])
-                elif "assert_count" in t:
-                    counts = {
-                        k: page.locator(f'{selector} [data-test="{k}"]').count()
-                        for k in t["assert_count"].keys()
-                    }
-                    ok = all(counts[k] == v for k, v in t["assert_count"].items())
-                elif "range" in t:
-                    n = page.locator(selector).count()
-                    lo, hi = t["range"]
-                    ok = lo <= n <= hi
-
-            elif method == "playwright":
-                for act in t.get("actions", []):
-                    if "swipe" in act:
-                        dx = -400 if act["swipe"] == "left" else 400
-                        page.mouse.move(400, 400)
-                        page.mouse.down()
-                        page.mouse.move(400 + dx, 400)
-                        page.mouse.up()
-                ok = True
-
-            results.append({"id": t.get("id", "T?"), "ok": ok})
-
-        browser.close()
+        context = browser.new_context()
+        if capture:
+            context.tracing.start(screenshots=True, snapshots=True)
+        page = context.new_page()
+        try:
+            page.goto(preview_url, wait_until="networkidle")
+
+            for t in tests:
+                method = t.get("method")
+                selector = t.get("selector")
+                ok = False
+
+                if method == "dom":
+                    if "assert" in t:
+                        html = page.inner_html(selector)
+                        ok = all(s in html for s in t["assert"])
+                    elif "assert_count" in t:
+                        counts = {
+                            k: page.locator(f'{selector} [data-test="{k}"]').count()
+                            for k in t["assert_count"].keys()
+                        }
+                        ok = all(counts[k] == v for k, v in t["assert_count"].items())
+                    elif "range" in t:
+                        n = page.locator(selector).count()
+                        lo, hi = t["range"]
+                        ok = lo <= n <= hi
+
+                elif method == "playwright":
+                    for act in t.get("actions", []):
+                        if "swipe" in act:
+                            dx = -400 if act["swipe"] == "left" else 400
+                            page.mouse.move(400, 400)
+                            page.mouse.down()
+                            page.mouse.move(400 + dx, 400)
+                            page.mouse.up()
+                    ok = True
+
+                results.append({"id": t.get("id", "T?"), "ok": ok})
+        finally:
+            # capture even when goto/an assertion raises: those are the runs worth inspecting
+            if capture:
+                _capture(page, context, artifacts)
+            browser.close()
 
     return type(
         "Report",
         (object,),
         {"passed": all(r["ok"] for r in results), "results": results},
     )
+
+
+def _capture(page, context, artifacts):
+    artifacts.screenshot(page, "qa.png")
+    try:
+        artifacts.save("qa.html", page.content())
+    except Exception:
+        pass
+    # tracing can only write to a path
+    fd, trace_path = tempfile.mkstemp(suffix=".zip")
+    os.close(fd)
+    try:
+        context.tracing.stop(path=trace_path)
+    except Exception:
+        os.unlink(trace_path)
+        return
+    # the writer thread moves/uploads the zip and removes the temp file
+    artifacts.save_file("qa-trace.zip", trace_path)
@@ -0,0 +1,58 @@
+"""
+Startup-time benchmark for the API and worker entrypoints.
+
+Imports each module in a fresh interpreter several times and reports the
+median wall time, plus any heavy module that leaked into the import graph.
+
+    python scripts/bench_startup.py [--runs 5] [--budget 1.0]
+"""
+import argparse, json, os, statistics, subprocess, sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+TARGETS = {
+    "api": "app.main",
+    "worker": "worker.tasks",
+}
+
+# Must only be imported when a task actually needs them
+HEAVY = ["playwright", "httpx", "boto3", "app.services.orchestrator", "app.services.base44_bot"]
+
+PROBE = """
+import json, sys, time
+t = time.perf_counter()
+import {module}
+dt = time.perf_counter() - t
+print(json.dumps({{"seconds": dt, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(module: str, runs: int):
+    times, heavy = [], set()
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        times.append(r["seconds"])
+        heavy.update(r["heavy"])
+    return statistics.median(times), sorted(heavy)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=1.0, help="max median import seconds")
+    args = ap.parse_args()
+
+    failed = False
+    for name, module in TARGETS.items():
+        median, heavy = measure(module, args.runs)
+        ok = median <= args.budget and not heavy
+        failed |= not ok
+        print(f"{name:<7} {module:<14} median={median * 1000:7.1f} ms  heavy={heavy or '-'}  {'OK' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+import os, time
+
+from app.services.artifact_store import ArtifactStore, LocalBackend, STALE_PART_S
+
+
+def _touch(root, key, size, age_s):
+    path = root / key
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    ts = time.time() - age_s
+    os.utime(path, (ts, ts))
+    return path
+
+
+def test_age_retention_removes_only_expired(tmp_path):
+    _touch(tmp_path, "1/iter-000/old.png", 10, age_s=7200)
+    _touch(tmp_path, "2/iter-000/new.png", 10, age_s=10)
+    store = ArtifactStore(LocalBackend(tmp_path), max_bytes=0, max_age_s=3600)
+
+    assert store.enforce_retention() == 1
+    assert [k for k, _, _ in store.backend.list()] == ["2/iter-000/new.png"]
+    assert not (tmp_path / "1").exists()  # empty run dirs are pruned
+
+
+def test_size_retention_removes_oldest_first(tmp_path):
+    _touch(tmp_path, "1/iter-000/a.png", 10, age_s=300)
+    _touch(tmp_path, "1/iter-000/b.png", 10, age_s=200)
+    _touch(tmp_path, "1/iter-000/c.png", 10, age_s=100)
+    store = ArtifactStore(LocalBackend(tmp_path), max_bytes=25, max_age_s=0)
+
+    assert store.enforce_retention() == 1
+    assert sorted(k for k, _, _ in store.backend.list()) == ["1/iter-000/b.png", "1/iter-000/c.png"]
+
+
+def test_in_flight_part_files_skipped_stale_ones_expired(tmp_path):
+    _touch(tmp_path, "1/iter-000/live.png.part", 10, age_s=10)
+    _touch(tmp_path, "1/iter-000/dead.png.part", 10, age_s=STALE_PART_S + 60)
+    store = ArtifactStore(LocalBackend(tmp_path), max_bytes=0, max_age_s=STALE_PART_S)
+
+    assert [k for k, _, _ in store.backend.list()] == ["1/iter-000/dead.png.part"]
+    assert store.enforce_retention() == 1
+    assert (tmp_path / "1/iter-000/live.png.part").exists()
+
+
+def test_recorder_writes_in_background_and_returns_location(tmp_path):
+    store = ArtifactStore(LocalBackend(tmp_path))
+    rec = store.recorder(7, 2)
+    src = tmp_path / "trace.zip"
+    src.write_bytes(b"zip")
+
+    loc = rec.save("qa.html", "<html></html>")
+    trace = rec.save_file("qa-trace.zip", src)
+    assert store.flush(timeout=5)
+
+    assert loc == str(tmp_path / "7/iter-002/qa.html")
+    assert (tmp_path / "7/iter-002/qa.html").read_text() == "<html></html>"
+    assert (tmp_path / "7/iter-002/qa-trace.zip").read_bytes() == b"zip"
+    assert trace.endswith("qa-trace.zip") and not src.exists()
+
+
+def test_put_drops_when_backlog_exceeds_byte_bound(tmp_path):
+    store = ArtifactStore(LocalBackend(tmp_path), max_queue_bytes=5)
+    assert store.put("1/iter-000/big.png", b"x" * 10) is None
+    assert store.flush(timeout=1)
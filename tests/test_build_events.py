@@ -0,0 +1,18 @@
+import pytest
+
+from app.services.build_events import build_complete_key
+
+
+def test_key_is_run_and_iteration():
+    assert build_complete_key({"run_id": 3, "iteration": 0}) == "builds.complete:3:0"
+
+
+@pytest.mark.parametrize("payload", [
+    {"iteration": 1},
+    {"run_id": 3},
+    {"run_id": 3, "iteration": None},
+    {},
+])
+def test_key_rejects_events_missing_run_or_iteration(payload):
+    with pytest.raises(ValueError):
+        build_complete_key(payload)
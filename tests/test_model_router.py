@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+from app.services import model_router
+from app.services.model_router import ModelRouter, MIN_SAMPLES
+
+
+class Transient(Exception):
+    pass
+
+
+class Fatal(Exception):
+    pass
+
+
+def make_router(models, timeout_s=5, budget_s=10):
+    stages = {"critic": {"models": list(models), "max_tokens": 100, "timeout_s": timeout_s, "budget_s": budget_s}}
+    return ModelRouter(stages, publish_every_s=None)
+
+
+def seed(router, model, latency_s, ok=True, n=MIN_SAMPLES):
+    for _ in range(n):
+        router.stats(model).record(latency_s, ok=ok)
+
+
+@pytest.fixture(autouse=True)
+def no_probes(monkeypatch):
+    monkeypatch.setattr(model_router, "PROBE_RATE", 0.0)
+
+
+def test_rank_prefers_lowest_p95():
+    r = make_router(["a", "b"])
+    seed(r, "a", 2.0)
+    seed(r, "b", 0.5)
+    assert r.rank("critic") == ["b", "a"]
+
+
+def test_unmeasured_models_rank_after_measured():
+    r = make_router(["new", "known"])
+    seed(r, "known", 3.0)
+    assert r.rank("critic") == ["known", "new"]
+
+
+def test_probe_sends_first_pick_to_unmeasured(monkeypatch):
+    monkeypatch.setattr(model_router, "PROBE_RATE", 1.0)
+    r = make_router(["known", "new"])
+    seed(r, "known", 0.1)
+    assert r.rank("critic") == ["new", "known"]
+
+
+def test_failed_attempts_count_toward_p95():
+    r = make_router(["a", "b"])
+    seed(r, "a", 0.1, n=MIN_SAMPLES - 1)
+    seed(r, "a", 30.0, ok=False, n=MIN_SAMPLES - 1)  # timeouts at 30 s, error rate < 50%
+    seed(r, "b", 1.0, n=MIN_SAMPLES * 2)
+    assert r.stats("a").healthy()
+    assert r.rank("critic") == ["b", "a"]
+
+
+def test_high_error_rate_benches_model():
+    r = make_router(["a", "b"])
+    seed(r, "a", 0.1, ok=False)
+    seed(r, "b", 1.0)
+    assert r.rank("critic") == ["b"]
+    assert r.stats("a").benched_until > time.time()
+
+
+def test_snapshot_does_not_bench():
+    r = make_router(["a"])
+    seed(r, "a", 0.1, ok=False)
+    r.snapshot()
+    assert r.stats("a").benched_until == 0.0
+    assert r.stats("a").error_rate() == 1.0
+
+
+def test_call_fails_over_on_retryable_only():
+    r = make_router(["a", "b"])
+    calls = []
+
+    def fn(model, max_tokens, timeout):
+        calls.append(model)
+        if model == "a":
+            raise Transient("503")
+        return model
+
+    assert r.call("critic", fn, retryable=(Transient,)) == "b"
+    assert calls == ["a", "b"]
+    assert r.failovers[("critic", "a")] == 1
+
+    def fatal(model, max_tokens, timeout):
+        raise Fatal("400")
+
+    with pytest.raises(Fatal):
+        r.call("critic", fatal, retryable=(Transient,))
+
+
+def test_call_stops_at_budget(monkeypatch):
+    monkeypatch.setattr(model_router, "MIN_ATTEMPT_S", 0.05)
+    r = make_router(["a", "b", "c"], timeout_s=0.1, budget_s=0.18)
+    timeouts = []
+
+    def slow(model, max_tokens, timeout):
+        timeouts.append(timeout)
+        time.sleep(timeout)
+        raise Transient(model)
+
+    with pytest.raises(Transient):
+        r.call("critic", slow, retryable=(Transient,))
+    assert len(timeouts) == 2  # "c" never started
+    assert timeouts[1] < 0.1   # second attempt only got what was left
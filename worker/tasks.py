@@ -1,9 +1,46 @@
 import os
 from celery import Celery
+from celery.signals import worker_process_init, worker_process_shutdown
 
 CELERY_BROKER = os.getenv("REDIS_URL", "redis://redis:6379/0")
 app = Celery("toolkit", broker=CELERY_BROKER, backend=CELERY_BROKER)
+app.conf.task_default_queue = "default"  # matches `-Q default` in docker-compose
+
+@worker_process_init.connect
+def _init_db(**_):
+    # The API owns DDL; workers just connect and wait for the schema.
+    from app.models.db import wait_for_schema
+    wait_for_schema()
+
+@worker_process_shutdown.connect
+def _flush_artifacts(**_):
+    # prefork children exit via os._exit, so atexit never runs there
+    from app.services.artifact_store import flush_default
+    flush_default()
 
 @app.task
 def noop(x=1):
     return x + 1
+
+# acks_late + reject_on_worker_lost: a task whose worker dies is redelivered with the
+# same id and re-claims its own event (see claim_webhook_event).
+@app.task(bind=True, acks_late=True, reject_on_worker_lost=True, max_retries=3)
+def process_build_complete(self, event_id: int):
+    from app.models.db import claim_webhook_event, release_webhook_event, finish_webhook_event, update_run
+    from app.services.build_events import WEBHOOK_LEASE_S
+    from app.services.orchestrator import on_build_complete
+
+    payload = claim_webhook_event(event_id, self.request.id, WEBHOOK_LEASE_S)
+    if payload is None:
+        return  # already done, or another task holds a live lease
+    try:
+        on_build_complete(payload)
+    except Exception as e:
+        if self.request.retries < self.max_retries:
+            release_webhook_event(event_id)
+            raise self.retry(exc=e, countdown=30 * 2 ** self.request.retries)
+        # A later delivery for the same run/iteration revives a failed event.
+        finish_webhook_event(event_id, "failed")
+        update_run(payload.get("run_id"), status="failed")
+        raise
+    finish_webhook_event(event_id, "done")